@@ -0,0 +1,101 @@
+""" On-disk cache of the notebook representations built by pynblint. """
+
+import contextlib
+import os
+import pickle
+import tempfile
+
+from pynblint import __version__
+
+# The cache is disabled unless a directory is provided through the environment
+CACHE_DIR = os.environ.get("PYNBLINT_CACHE_DIR")
+
+# Protocol 5, the highest one since Python 3.8, cannot be read by Python 3.7, which may share the same cache directory
+_PICKLE_PROTOCOL = 4
+
+# Version of the layout of the cached representations, to be increased whenever it changes,
+# so that entries written in a previous format are never loaded
+CACHE_FORMAT_VERSION = 1
+
+
+def enabled():
+    """
+        Tells whether the on-disk cache is enabled
+
+        Returns:
+            True: in case a cache directory is provided through the PYNBLINT_CACHE_DIR environment variable
+            False: otherwise
+
+        A way you might use me is
+
+        nb_key = hashlib.sha1(nb_raw).hexdigest() if cache.enabled() else None
+    """
+    return CACHE_DIR is not None
+
+
+def _entry_path(key):
+    """
+        Path of the cache entry stored under the given key
+
+        Args:
+            key(str): hex digest identifying the cached content
+        Returns:
+            path: path of the pickle file holding the entry
+    """
+    return os.path.join(CACHE_DIR, "{}-{}".format(__version__, CACHE_FORMAT_VERSION), key + ".pkl")
+
+
+def load(key):
+    """
+        Retrieves an entry from the on-disk cache
+
+        Args:
+            key(str): hex digest identifying the cached content
+        Returns:
+            value: the cached object
+            None: in case the cache is disabled or the entry is missing or unreadable
+
+        A way you might use me is
+
+        nb_data = cache.load(hashlib.sha1(nb_raw).hexdigest())
+    """
+    if not enabled():
+        return None
+    try:
+        with open(_entry_path(key), "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # Besides I/O errors, unpickling a stale, corrupt or foreign entry can raise almost anything
+        # (UnpicklingError, ValueError, ImportError, AttributeError, ...): the notebook is simply parsed again
+        return None
+
+
+def store(key, value):
+    """
+        Stores an entry in the on-disk cache, atomically replacing any previous one
+
+        Args:
+            key(str): hex digest identifying the cached content
+            value: picklable object to be cached
+
+        A way you might use me is
+
+        cache.store(hashlib.sha1(nb_raw).hexdigest(), (nb_dict, script))
+    """
+    if not enabled():
+        return
+    path = _entry_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    except OSError:
+        # A cache that cannot be written is not an error: the notebook will simply be parsed again
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=_PICKLE_PROTOCOL)
+        os.replace(tmp_path, path)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError):
+        # Do not leave partially written entries behind; unpicklable objects raise any of the last three
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
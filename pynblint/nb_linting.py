@@ -1,6 +1,216 @@
 import ast
+import functools
 import os
 import re
+import string
+from collections import Counter
+from dataclasses import dataclass
+
+from IPython.core.inputtransformer2 import TransformerManager
+
+# Translates IPython-specific syntax (magics, shell escapes) into plain Python, as nbconvert does
+_ipython_transformer = TransformerManager()
+
+# Markdown rows starting with '#', possibly after some indentation
+_MD_TITLE_RE = re.compile(r'^[^\S\n]*#', re.MULTILINE)
+
+# Default filenames given by Jupyter to new notebooks
+_UNTITLED_FILENAME_RE = re.compile(r'Untitled\d*\.ipynb')
+
+# Characters of the [A-Za-z0-9_.-] charset allowed in notebook filenames
+_FILENAME_CHARSET = frozenset(string.ascii_letters + string.digits + '_.-')
+
+
+@dataclass
+class NotebookStats:
+    """
+    This class stores the cell-level statistics of a notebook,
+    collected by compute_stats in a single pass over its cells
+    """
+    cells: int = 0
+    md_cells: int = 0
+    code_cells: int = 0
+    raw_cells: int = 0
+    non_executed_cells: int = 0
+    empty_cells: int = 0
+    md_lines: int = 0
+    md_titles: int = 0
+    bottom_md_lines: int = 0
+    bottom_non_executed_cells: int = 0
+    bottom_empty_cells: int = 0
+    linear_execution_order: bool = True
+
+
+def compute_stats(nb_dict, bottom_size=4):
+    """
+        Collects all the cell-level statistics of a notebook with a single traversal of its cells
+
+        Args:
+            nb_dict(dict): python dictionary object representing the jupyter notebook
+            bottom_size(int): number of cells starting from the bottom of the dictionary
+        Returns:
+            stats: NotebookStats object holding the statistics of the notebook
+
+        A way you might use me is
+
+        stats = compute_stats(nb.nb_dict)
+    """
+    md_cells = code_cells = raw_cells = 0
+    non_executed_cells = empty_cells = 0
+    bottom_non_executed_cells = bottom_empty_cells = 0
+    md_lines = md_titles = bottom_md_lines = 0
+    linear_execution_order = True
+    counter = 1
+    cells = nb_dict["cells"]
+    bottom_start = len(cells) - bottom_size  # index of the first cell in the bottom of the notebook
+    for index, cell in enumerate(cells):
+        cell_type = cell["cell_type"]
+        source = cell["source"]
+        if cell_type == 'code':
+            code_cells += 1
+            execution_count = cell["execution_count"]
+            if execution_count is None:
+                if source:
+                    non_executed_cells += 1  # This is a not executed Python Cell containing actual code
+                    if index >= bottom_start:
+                        bottom_non_executed_cells += 1
+                else:
+                    empty_cells += 1  # This is an empty Python Cell
+                    if index >= bottom_start:
+                        bottom_empty_cells += 1
+            if linear_execution_order:  # once a cell is out of order, the remaining ones need no check
+                if counter == execution_count:
+                    counter += 1
+                elif source:
+                    linear_execution_order = False
+                # an empty cell out of sequence is skipped, without advancing the counter
+        elif cell_type == 'markdown':
+            md_cells += 1
+            text = _cell_text(cell)
+            lines = _count_lines(text)
+            md_lines += lines
+            if index >= bottom_start:
+                bottom_md_lines += lines
+            md_titles += len(_MD_TITLE_RE.findall(text))
+        elif cell_type == 'raw':
+            raw_cells += 1
+    return NotebookStats(
+        cells=len(cells),
+        md_cells=md_cells,
+        code_cells=code_cells,
+        raw_cells=raw_cells,
+        non_executed_cells=non_executed_cells,
+        empty_cells=empty_cells,
+        md_lines=md_lines,
+        md_titles=md_titles,
+        bottom_md_lines=bottom_md_lines,
+        bottom_non_executed_cells=bottom_non_executed_cells,
+        bottom_empty_cells=bottom_empty_cells,
+        linear_execution_order=linear_execution_order,
+    )
+
+
+def _count_lines(text):
+    """The function takes a string and returns the number of lines in it
+
+        Args:
+            text(str): text of a cell
+        Returns:
+            lines: number of lines in the text, where a trailing newline does not start a new line
+
+        The function is used in:
+        - compute_stats(nb_dict)
+    """
+    if not text:
+        return 0
+    return text.count('\n') + (not text.endswith('\n'))
+
+
+@functools.lru_cache(maxsize=128)
+def _parse(code):
+    """The function takes a string of Python code and returns its AST, memoized on the source text
+
+        Args:
+            code(str): Python source code
+        Returns:
+            tree: ast.Module object representing the parsed code
+
+        The function is used in:
+        - are_imports_in_first_cell(nb)
+    """
+    return ast.parse(code)
+
+
+class _TopLevelCounter(ast.NodeVisitor):
+    """
+    This class counts the definitions at the top level of a module
+    in a single visit of its AST
+    """
+
+    def __init__(self):
+        self.func_defs = 0
+        self.class_defs = 0
+
+    def visit_Module(self, node):
+        # AST node classes are never subclassed, so counting exact types is enough
+        node_types = Counter(type(exp) for exp in node.body)
+        self.func_defs = node_types[ast.FunctionDef] + node_types[ast.AsyncFunctionDef]
+        self.class_defs = node_types[ast.ClassDef]
+
+
+def ast_stats(tree):
+    """
+        Collects the AST-derived statistics of a Python code with a single traversal of its AST
+
+        Args:
+            tree(ast.Module): AST of the Python code
+        Returns:
+            stats: object whose func_defs and class_defs attributes hold the number of top-level
+                   function and class definitions in the code
+
+        A way you might use me is
+
+        func_defs_count = ast_stats(nb.script_ast).func_defs
+
+        The function is used in:
+        - Notebook.script_stats
+    """
+    counter = _TopLevelCounter()
+    counter.visit(tree)
+    return counter
+
+
+def get_cell_code(cell):
+    """
+    The function takes a code cell and returns its source as plain Python code
+
+        Args:
+            cell(dict): dictionary object representing a notebook cell
+        Returns:
+            code: string of Python code, where IPython magics are translated into function calls
+
+        A way you might use me is
+
+        code = get_cell_code(nb.nb_dict["cells"][0])
+    """
+    return _ipython_transformer.transform_cell(_cell_text(cell))
+
+
+def _cell_text(cell):
+    """The function takes a cell and returns its source as a single string
+
+        Args:
+            cell(dict): dictionary object representing a notebook cell
+        Returns:
+            text: source of the cell, whether it is stored as a string or as a list of lines
+
+        The function is used in:
+        - compute_stats(nb_dict)
+        - get_cell_code(cell)
+        - are_imports_in_first_cell(nb)
+    """
+    source = cell["source"]
+    return source if isinstance(source, str) else ''.join(source)
 
 
 def count_func_defs(notebook):
@@ -10,16 +220,15 @@ def count_func_defs(notebook):
        Args:
            notebook(Notebook): python object representing the notebook
        Returns:
-           f_num: integer representing the number of function definitions in the code
+           notebook.script_stats.func_defs: integer representing the number of function definitions in the code
 
        A way you might use me is
 
        function_defs_count = count_func_defs(nb)
     """
-    code = notebook.script
-    tree = ast.parse(code)
-    f_num = sum(isinstance(exp, ast.FunctionDef) for exp in tree.body)
-    return f_num
+    if 'def' not in notebook.script:
+        return 0  # no need to parse a script that cannot contain a function definition
+    return notebook.script_stats.func_defs
 
 
 def count_non_executed_cells(notebook):
@@ -29,14 +238,13 @@ def count_non_executed_cells(notebook):
         Args:
            notebook(Notebook): python object representing the notebook
         Returns:
-            _non_executed_cells_count(notebook["cells"]): integer representing the number of non-executed cells in the notebook
+            notebook.stats.non_executed_cells: integer representing the number of non-executed cells in the notebook
 
         A way you might use me is
 
         non-exec_cells_count = count_non_executed_cells(nb)
     """
-    nb_dict = notebook.nb_dict
-    return _non_executed_cells_count(nb_dict["cells"])
+    return notebook.stats.non_executed_cells
 
 
 def count_empty_cells(notebook):
@@ -46,14 +254,13 @@ def count_empty_cells(notebook):
         Args:
            notebook(Notebook): python object representing the notebook
         Returns:
-            _empty_cells_count(nb_dict["cells"]): integer representing the number of empty cells in the notebook
+            notebook.stats.empty_cells: integer representing the number of empty cells in the notebook
 
         A way you might use me is
 
         empty_cells_count = count_empty_cells(nb)
     """
-    nb_dict = notebook.nb_dict
-    return _empty_cells_count(nb_dict["cells"])
+    return notebook.stats.empty_cells
 
 
 def count_md_lines(notebook):
@@ -63,19 +270,13 @@ def count_md_lines(notebook):
         Args:
            notebook(Notebook): python object representing the notebook
         Returns:
-            markdowns: integer representing the number of markdown rows in the notebook
+            notebook.stats.md_lines: integer representing the number of markdown rows in the notebook
 
         A way you might use me is
 
         md_lines_count = count_md_lines(nb)
     """
-    nb_dict = notebook.nb_dict
-    markdowns = 0
-    for cell in nb_dict["cells"]:
-        if cell["cell_type"] == 'markdown':
-            rows = len(cell['source'])
-            markdowns = markdowns + rows
-    return markdowns
+    return notebook.stats.md_lines
 
 
 def count_md_titles(notebook):
@@ -85,20 +286,13 @@ def count_md_titles(notebook):
         Args:
            notebook(Notebook): python object representing the notebook
         Returns:
-            titles: integer representing the number of markdown title rows in the notebook
+            notebook.stats.md_titles: integer representing the number of markdown title rows in the notebook
 
         A way you might use me is
 
         titles_count = count_md_titles(nb)
     """
-    nb_dict = notebook.nb_dict
-    titles = 0
-    for cell in nb_dict["cells"]:
-        if cell["cell_type"] == 'markdown':
-            for row in cell['source']:
-                if row.lstrip().startswith('#'):
-                    titles = titles + 1
-    return titles
+    return notebook.stats.md_titles
 
 
 def are_imports_in_first_cell(notebook):
@@ -114,34 +308,19 @@ def are_imports_in_first_cell(notebook):
 
         all_imports_in_first_cell = are_imports_in_first_cell(nb)
     """
-    code = notebook.script
-    found_first_cell = False  # when True it means we found the first cell of code that has to be ignored
-    second_cell_not_reached = True
-    # when set to False we are actually reading instructions from the second cell of
-    # code, from now on we need to analyze all the cells looking for import statements
-    correct_position = True
-    cell = ''
-    program = code.split('\n')
-    for line in program:
-        if not found_first_cell:
-            # it ignores all the lines before the first cell generated by nbconvert(python# version ecc.)
-            if line[0:5] == '# In[':
-                found_first_cell = True
-        elif not second_cell_not_reached:
-            # starting from the second cell it saves all the instructions until it find a new cell
-            if line[0:5] != '# In[':
-                cell = cell + '\n' + line
-            else:
-                tree = ast.parse(cell)
-                # once it finds a new cell it verifies if there are any imports statement in the previous cell
-                if sum(isinstance(exp, ast.Import) for exp in tree.body) > 0:
-                    correct_position = False
-                    break
-        else:
-            if line[0:5] == '# In[':
-                # following instructions are from the second cell of code, the first one we have to analyze
-                second_cell_not_reached = False
-    return correct_position
+    code_cells = [cell for cell in notebook.nb_dict["cells"] if cell["cell_type"] == 'code']
+    for cell in code_cells[1:]:
+        # the first cell of code is ignored, all the others are checked for import statements
+        text = _cell_text(cell)
+        if 'import' not in text:
+            continue  # every import statement contains the keyword, no need to parse the cell
+        try:
+            tree = _parse(_ipython_transformer.transform_cell(text))
+        except SyntaxError:
+            continue  # a cell that does not parse cannot execute any import
+        if any(isinstance(exp, (ast.Import, ast.ImportFrom)) for exp in tree.body):
+            return False
+    return True
 
 
 def has_linear_execution_order(notebook):
@@ -149,28 +328,20 @@ def has_linear_execution_order(notebook):
     The function takes a notebook and returns True if the cells are executed in
     sequential order,starting from 1, and False otherwise
 
-        Verifies if the notebook has been run in sequential order, starting from 1
+        Verifies if the notebook has been run in sequential order, starting from 1.
+        Code cells with an empty source are ignored when their execution count is out of sequence,
+        so they neither break the order nor advance the expected execution count.
 
         Args:
             notebook(Notebook): python object representing the notebook
         Returns:
-            correct_exec: boolean value that is True if notebook cells have been sequentially run top to bottom
+            notebook.stats.linear_execution_order: boolean value that is True if notebook cells have been sequentially run top to bottom
 
         A way you might use me is
 
         linear_exec_order = has_linear_execution_order(nb)
     """
-    correct_exec = True
-    counter = 1
-    nb_dict = notebook.nb_dict
-    for cell in nb_dict["cells"]:
-        if cell["cell_type"] == 'code':
-            if counter == cell['execution_count']:
-                counter = counter + 1
-            else:
-                if cell['source']:
-                    correct_exec = False
-    return correct_exec
+    return notebook.stats.linear_execution_order
 
 
 def count_class_defs(notebook):
@@ -181,56 +352,15 @@ def count_class_defs(notebook):
         Args:
             notebook(Notebook): python object representing the notebook
         Returns:
-            class_def_num: integer value representing the number of class definitions in the python code
+            notebook.script_stats.class_defs: integer value representing the number of class definitions in the python code
 
         A way you might use me is
 
         class_def_count = count_class_defs(nb)
     """
-    code = notebook.script
-    tree = ast.parse(code)
-    class_def_num = sum(isinstance(exp, ast.ClassDef) for exp in tree.body)
-    return class_def_num
-
-
-def _non_executed_cells_count(cell_list):
-    """The function takes a list of cells and returns the number of non-executed cells
-
-        Args:
-            cell_list(list): list of dictionary objects representing the notebook cells
-        Returns:
-            non_exec_cells: number of non-executed cells in the list
-        
-        The function is used in:
-        - count_non-executed_cells(nb)
-        - count_bottom_non-executed_cells(nb, bottom_size=4)
-    """
-    non_exec_cells = 0
-    for cell in cell_list:
-        if cell["cell_type"] == 'code':
-            if cell['execution_count'] is None and cell['source'] != []:
-                non_exec_cells = non_exec_cells + 1  # This is a not executed Python Cell containing actual code
-    return non_exec_cells
-
-
-def _empty_cells_count(cell_list):
-    """The function takes a list of cells and returns the number of empty cells
-
-        Args:
-            cell_list(list): list of dictionary objects representing the notebook cells
-        Returns:
-            empty_cells: number of empty cells in the list
-
-        The function is used in:
-        - count_empty_cells(nb)
-        - count_bottom_empty_cells(nb, bottom_size=4)
-    """
-    empty_cell = 0
-    for cell in cell_list:
-        if cell["cell_type"] == 'code':
-            if cell['execution_count'] is None and cell['source'] == []:
-                empty_cell = empty_cell + 1  # This is an empty Python Cell
-    return empty_cell
+    if 'class' not in notebook.script:
+        return 0  # no need to parse a script that cannot contain a class definition
+    return notebook.script_stats.class_defs
 
 
 def count_bottom_non_executed_cells(notebook, bottom_size=4):
@@ -245,20 +375,17 @@ def count_bottom_non_executed_cells(notebook, bottom_size=4):
             notebook(Notebook): python object representing the notebook
             bottom_size(int): number of cells starting from the bottom of the dictionary
         Returns:
-            _non_executed_cells_count(cell_list): number of non-executed cells in the bottom-size last section of the notebook
+            stats.bottom_non_executed_cells: number of non-executed cells in the bottom-size last section of the notebook
             None: in case the precondition is not satisfied
 
         A way you might use me is
 
         bottom_non_executed_cells = count_bottom_non_executed_cells(nb)
     """
-    nb_dict = notebook.nb_dict
-    if bottom_size < (
-            len(nb_dict["cells"]) / 3):  # puo essere sostituito con la funzione count_cells() una volta creata
-        cell_list = _extract_bottom_cells_of_code(nb_dict, bottom_size)
-    else:
+    stats = notebook.get_stats(bottom_size)
+    if not _is_bottom_size_valid(stats, bottom_size):
         return None
-    return _non_executed_cells_count(cell_list)
+    return stats.bottom_non_executed_cells
 
 
 def count_bottom_empty_cells(notebook, bottom_size=4):
@@ -273,47 +400,35 @@ def count_bottom_empty_cells(notebook, bottom_size=4):
             notebook(Notebook): python object representing the notebook
             bottom_size(int): number of cells starting from the bottom of the dictionary
         Returns:
-            _empty_cells_count(cell_list): number of empty cells in the bottom-size last section of the notebook
+            stats.bottom_empty_cells: number of empty cells in the bottom-size last section of the notebook
             None: in case the precondition is not satisfied
 
         A way you might use me is
 
         bottom_empty_cells = count_bottom_empty_cells(nb)
     """
-    nb_dict = notebook.nb_dict
-    if bottom_size < (
-            len(nb_dict["cells"]) / 3):  # puo essere sostituito con la funzione count_cells() una volta creata
-        cell_list = _extract_bottom_cells_of_code(nb_dict, bottom_size)
-    else:
+    stats = notebook.get_stats(bottom_size)
+    if not _is_bottom_size_valid(stats, bottom_size):
         return None
-    return _empty_cells_count(cell_list)
+    return stats.bottom_empty_cells
 
 
-def _extract_bottom_cells_of_code(nb_dict, bottom_size):
+def _is_bottom_size_valid(stats, bottom_size):
     """
-        It returns a list of the code cells between the last bottom_size cells of the notebook
+        Verifies that the bottom of the notebook is not more than the 33.3% of the whole notebook
 
         Args:
-            nb_dict(dict): python dictionary object representing the jupyter notebook
+            stats(NotebookStats): statistics of the notebook
             bottom_size(int): number of cells starting from the bottom of the dictionary
         Returns:
-           cell_list: list of code cells between the last bottom_size cells of the notebook
+            boolean: True if bottom_size is minor then the dimension of the notebook divided by 3, False otherwise
 
         The function is used in:
-        - count_bottom_empty_cells()
-        - count_bottom_non_executed_cells()
+        - count_bottom_non_executed_cells(nb, bottom_size=4)
+        - count_bottom_empty_cells(nb, bottom_size=4)
+        - get_bottom_md_lines_ratio(nb, bottom_size=4)
     """
-    cell_list = []
-    counter = 1
-    full_list = nb_dict["cells"]
-    for cell in reversed(full_list):
-        if counter <= bottom_size:
-            if cell["cell_type"] == 'code':
-                cell_list.append(cell)
-                counter = counter + 1
-        else:
-            break
-    return cell_list
+    return bottom_size < stats.cells / 3
 
 
 def count_cells(notebook):
@@ -323,14 +438,13 @@ def count_cells(notebook):
         Args:
             notebook(Notebook): python object representing the notebook
         Returns:
-            len(nb_dict["cells"]): integer value representing the number of cells into the notebook
+            notebook.stats.cells: integer value representing the number of cells into the notebook
 
         A way you might use me is
 
         cells_count = count_cells(nb)
     """
-    nb_dict = notebook.nb_dict
-    return len(nb_dict["cells"])
+    return notebook.stats.cells
 
 
 def count_md_cells(notebook):
@@ -340,18 +454,13 @@ def count_md_cells(notebook):
         Args:
             notebook(Notebook): python object representing the notebook
         Returns:
-            counter: integer value representing the number of markdown cells into the notebook
+            notebook.stats.md_cells: integer value representing the number of markdown cells into the notebook
 
         A way you might use me is
 
         md_cells_count = count_md_cells(nb)
     """
-    nb_dict = notebook.nb_dict
-    counter = 0
-    for cell in nb_dict["cells"]:
-        if cell["cell_type"] == 'markdown':
-            counter = counter + 1
-    return counter
+    return notebook.stats.md_cells
 
 
 def count_code_cells(notebook):
@@ -361,18 +470,13 @@ def count_code_cells(notebook):
         Args:
             notebook(Notebook): python object representing the notebook
         Returns:
-            counter: integer value representing the number of code cells into the notebook
+            notebook.stats.code_cells: integer value representing the number of code cells into the notebook
 
         A way you might use me is
 
         code_cell_count = count_code_cells(nb)
     """
-    nb_dict = notebook.nb_dict
-    counter = 0
-    for cell in nb_dict["cells"]:
-        if cell["cell_type"] == 'code':
-            counter = counter + 1
-    return counter
+    return notebook.stats.code_cells
 
 
 def count_raw_cells(notebook):
@@ -382,18 +486,13 @@ def count_raw_cells(notebook):
         Args:
             notebook(Notebook): python object representing the notebook
         Returns:
-            counter: integer value representing the number of raw cells into the notebook
+            notebook.stats.raw_cells: integer value representing the number of raw cells into the notebook
 
         A way you might use me is
 
         raw_cells_count = count_raw_cells(nb)
     """
-    nb_dict = notebook.nb_dict
-    counter = 0
-    for cell in nb_dict["cells"]:
-        if cell["cell_type"] == 'raw':
-            counter = counter + 1
-    return counter
+    return notebook.stats.raw_cells
 
 
 def get_bottom_md_lines_ratio(notebook, bottom_size=4):
@@ -405,51 +504,39 @@ def get_bottom_md_lines_ratio(notebook, bottom_size=4):
         dimension of the notebook divided by 3.
 
         Args: notebook(Notebook): python object representing the notebook
+              bottom_size(int): number of cells starting from the bottom of the dictionary
 
-        Returns: md_bottom_cells/md_first_cells: Percentage of markdown rows in the last cells of the notebook
+        Returns: stats.bottom_md_lines/stats.md_lines: Percentage of markdown rows in the last cells of the notebook
+                 0: in case the notebook has no markdown rows
                  None: in case the precondition is not satisfied
 
         A way you might use me is
 
         last_ten_cells_md_ratio = get_bottom_md_lines_ratio(nb, 10)
     """
-    nb_dict = notebook.nb_dict
-    total_cells = count_cells(notebook)
-    if bottom_size < total_cells / 3:
-        md_first_cells = 0
-        md_bottom_cells = 0
-        cell_counter = 1
-        for cell in nb_dict["cells"]:
-            if cell_counter <= total_cells - bottom_size and cell["cell_type"] == "markdown":
-                md_first_cells = md_first_cells + len(cell["source"])
-            elif cell_counter > total_cells - bottom_size and cell["cell_type"] == "markdown":
-                md_bottom_cells = md_bottom_cells + len(cell["source"])
-            cell_counter = cell_counter + 1
-    else:
+    stats = notebook.get_stats(bottom_size)
+    if not _is_bottom_size_valid(stats, bottom_size):
         return None
-    if md_first_cells + md_bottom_cells == 0:
+    if stats.md_lines == 0:
         return 0
-    else:
-        return md_bottom_cells / (md_first_cells + md_bottom_cells)
+    return stats.bottom_md_lines / stats.md_lines
 
 
 def is_titled(notebook):
     """
-    The function takes a notebook and checks whether it has been titled or it still has the default title: "Untitled.ipynb"
+    The function takes a notebook and checks whether it has been titled or it still has a default title given by
+    Jupyter: "Untitled.ipynb", "Untitled1.ipynb", "Untitled2.ipynb" and so on
 
         Args:
             notebook(Notebook): python object representing the notebook
         Returns:
-            boolean: False if the name of the notebook is Untitled, True otherwise
+            boolean: False if the name of the notebook is a default Untitled one, True otherwise
 
         A way you might use me is
 
         untitled = is_titled(notebook)
     """
-    if os.path.basename(notebook.path) == "Untitled.ipynb":
-        return False
-    else:
-        return True
+    return _UNTITLED_FILENAME_RE.fullmatch(os.path.basename(notebook.path)) is None
 
 
 def is_filename_charset_restricted(notebook):
@@ -465,10 +552,8 @@ def is_filename_charset_restricted(notebook):
 
         restricted_filename = is_filename_charset_restricted(notebook)
     """
-    if re.search("^[A-Za-z0-9_.-]+$", os.path.basename(notebook.path)):
-        return True
-    else:
-        return False
+    filename = os.path.basename(notebook.path)
+    return bool(filename) and _FILENAME_CHARSET.issuperset(filename)
 
 
 def is_filename_short(notebook, filename_max_length):
@@ -485,7 +570,4 @@ def is_filename_short(notebook, filename_max_length):
 
         short_filename = is_filename_short(notebook)
     """
-    if len(os.path.basename(notebook.path)) > filename_max_length:
-        return False
-    else:
-        return True
+    return len(os.path.basename(notebook.path)) <= filename_max_length
@@ -1,10 +1,38 @@
+import ast
+import functools
+import hashlib
 import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Iterable, List, Optional, Union
 
-import nbformat
-from nbconvert import PythonExporter
+from pynblint import cache, nb_linting
 
-from pynblint import nb_linting
+try:
+    # orjson decodes large notebooks several times faster than the standard library,
+    # and reads them straight from the memory-mapped file
+    import orjson
+
+    def _json_loads(buffer):
+        with memoryview(buffer) as view:
+            try:
+                return orjson.loads(view)
+            except orjson.JSONDecodeError:
+                pass
+        # orjson is stricter than the standard library, which also accepts the NaN and Infinity values
+        # written by json.dumps() (and so by nbformat), and a leading UTF-8 BOM
+        return json.loads(bytes(buffer))
+except ImportError:
+    def _json_loads(buffer):
+        return json.loads(bytes(buffer))
+
+# Below this number of notebooks, spawning worker processes costs more than it saves
+_MIN_PARALLEL_NOTEBOOKS = 4
+
+# Maximum number of notebooks sent to a worker process at once, to amortize the inter-process communication
+_MAX_CHUNKSIZE = 8
 
 
 class Notebook:
@@ -13,22 +41,68 @@ class Notebook:
     on which pynblint functions are called
     """
 
-    def __init__(self, notebook_path: Path, repository_path: Path = None, notebook_name: str = None):
-        self.path = notebook_path
+    def __init__(self, notebook_path: Union[Path, str, os.PathLike], repository_path: Path = None,
+                 notebook_name: str = None):
+        self.path = Path(notebook_path)
         self.repository_path = repository_path
         self.notebook_name = notebook_name
+        self._stats = {}  # NotebookStats objects, by bottom_size
+        self._script_ast = None
+        self._script_stats = None
+
+        # Map the raw notebook file in memory, so that it can be hashed and decoded without copying it
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as _nb_raw:
+
+            # Reuse the representations built on a previous run, if the notebook did not change;
+            # the file is hashed only when the cache is enabled
+            _nb_key = hashlib.sha1(_nb_raw).hexdigest() if cache.enabled() else None
+            if _nb_key is not None:
+                _cached = cache.load(_nb_key)
+                if _cached is not None:
+                    self.nb_dict, self.script = _cached
+                    return
+
+            # Convert the notebook to a Python dictionary
+            self.nb_dict = _json_loads(_nb_raw)
+
+        # Store each cell source as a single string, as nbformat does, so that it is joined only once
+        for cell in self.nb_dict["cells"]:
+            if not isinstance(cell["source"], str):
+                cell["source"] = ''.join(cell["source"])
+
+        # Convert the notebook to a Python script, made of the code of its code cells. Unlike nbconvert's
+        # PythonExporter, raw cells are left out: Jupyter never executes them, so their definitions are not counted
+        self.script = '\n\n'.join(
+            nb_linting.get_cell_code(cell) for cell in self.nb_dict["cells"] if cell["cell_type"] == 'code'
+        )
 
-        # Read the raw notebook file
-        with open(self.path) as f:
-            _nb_raw = f.read()
+        if _nb_key is not None:
+            cache.store(_nb_key, (self.nb_dict, self.script))
 
-        # Convert the notebook to a Python dictionary
-        self.nb_dict = json.loads(_nb_raw)
+    @property
+    def script_ast(self) -> ast.Module:
+        """AST of the notebook script, parsed on first access"""
+        if self._script_ast is None:
+            self._script_ast = ast.parse(self.script)
+        return self._script_ast
 
-        # Convert the notebook to a Python script
-        _nb_node = nbformat.reads(_nb_raw, as_version=self.nb_dict['nbformat'])
-        python_exporter = PythonExporter()
-        self.script, _ = python_exporter.from_notebook_node(_nb_node)
+    @property
+    def script_stats(self):
+        """Top-level definition counts of the notebook script, collected on first access with a single AST visit"""
+        if self._script_stats is None:
+            self._script_stats = nb_linting.ast_stats(self.script_ast)
+        return self._script_stats
+
+    def get_stats(self, bottom_size: int = 4) -> nb_linting.NotebookStats:
+        """Cell-level statistics of the notebook, collected on first request for each bottom_size"""
+        if bottom_size not in self._stats:
+            self._stats[bottom_size] = nb_linting.compute_stats(self.nb_dict, bottom_size)
+        return self._stats[bottom_size]
+
+    @property
+    def stats(self) -> nb_linting.NotebookStats:
+        """Cell-level statistics of the notebook, with the default bottom_size"""
+        return self.get_stats()
 
     def get_pynblint_results(self, bottom_size: int = 4,  filename_max_length=None):
 
@@ -39,24 +113,26 @@ class Notebook:
         else:
             nb_name = str(self.path)
 
+        # All the cell-level metrics come from a single traversal of the cells
+        stats = self.get_stats(bottom_size)
         results = {
             "notebookName": nb_name,
             "notebookStats": {
-                "numberOfCells": nb_linting.count_cells(self),
-                "numberOfMDCells": nb_linting.count_md_cells(self),
-                "numberOfCodeCells": nb_linting.count_code_cells(self),
-                "numberOfRawCells": nb_linting.count_raw_cells(self),
+                "numberOfCells": stats.cells,
+                "numberOfMDCells": stats.md_cells,
+                "numberOfCodeCells": stats.code_cells,
+                "numberOfRawCells": stats.raw_cells,
             },
             "lintingResults": {
-                "linearExecutionOrder": nb_linting.has_linear_execution_order(self),
+                "linearExecutionOrder": stats.linear_execution_order,
                 "numberOfClassDefinitions": nb_linting.count_class_defs(self),
                 "numberOfFunctionDefinitions": nb_linting.count_func_defs(self),
                 "allImportsInFirstCell": nb_linting.are_imports_in_first_cell(self),
-                "numberOfMarkdownLines": nb_linting.count_md_lines(self),
-                "numberOfMarkdownTitles": nb_linting.count_md_titles(self),
+                "numberOfMarkdownLines": stats.md_lines,
+                "numberOfMarkdownTitles": stats.md_titles,
                 "bottomMarkdownLinesRatio": nb_linting.get_bottom_md_lines_ratio(self, bottom_size),
-                "nonExecutedCells": nb_linting.count_non_executed_cells(self),
-                "emptyCells": nb_linting.count_empty_cells(self),
+                "nonExecutedCells": stats.non_executed_cells,
+                "emptyCells": stats.empty_cells,
                 "bottomNonExecutedCells": nb_linting.count_bottom_non_executed_cells(self, bottom_size),
                 "bottomEmptyCells": nb_linting.count_bottom_empty_cells(self, bottom_size),
                 "isTitled": nb_linting.is_titled(self),
@@ -67,3 +143,73 @@ class Notebook:
             results["lintingResults"]["isFilenameShort"] = nb_linting.is_filename_short(self, filename_max_length)
         return results
 
+
+def _map_notebooks(func, notebook_paths: List[Path], workers: Optional[int]) -> list:
+    """
+        Applies func to every notebook path, spreading the calls over a pool of worker processes
+
+        Args:
+            func: picklable callable taking a notebook path
+            notebook_paths(List[Path]): paths of the notebooks
+            workers(int): maximum number of worker processes, None uses one process per processor
+        Returns:
+            results: list of the values returned by func, in the same order as notebook_paths
+
+        The function is used in:
+        - load_notebooks(notebook_paths)
+        - lint_notebooks(notebook_paths)
+    """
+    if workers == 1 or len(notebook_paths) < _MIN_PARALLEL_NOTEBOOKS:
+        return [func(path) for path in notebook_paths]
+    # Chunks are kept small enough for every worker to get several of them, so that the load stays balanced
+    chunksize = max(1, min(_MAX_CHUNKSIZE, len(notebook_paths) // ((workers or os.cpu_count() or 1) * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, notebook_paths, chunksize=chunksize))
+
+
+def load_notebooks(notebook_paths: Iterable[Path], repository_path: Path = None, workers: int = 1) -> List[Notebook]:
+    """
+        Builds the Notebook objects of many notebooks, optionally spreading them over a pool of worker processes
+
+        Args:
+            notebook_paths(Iterable[Path]): paths of the notebooks to be loaded
+            repository_path(Path): path of the repository containing the notebooks, if any
+            workers(int): maximum number of worker processes; the default works serially, None uses one process
+                          per processor. Worker processes require the calling script to be guarded by
+                          `if __name__ == '__main__':` where processes are spawned (the default on macOS and Windows)
+        Returns:
+            notebooks: list of Notebook objects, in the same order as notebook_paths
+
+        A way you might use me is
+
+        notebooks = load_notebooks(Path("notebooks").glob("*.ipynb"), workers=None)
+    """
+    load = functools.partial(Notebook, repository_path=repository_path)
+    return _map_notebooks(load, list(notebook_paths), workers)
+
+
+def _lint_notebook(notebook_path: Path, bottom_size: int, filename_max_length: Optional[int]):
+    return Notebook(notebook_path).get_pynblint_results(bottom_size, filename_max_length)
+
+
+def lint_notebooks(notebook_paths: Iterable[Path], bottom_size: int = 4, filename_max_length=None,
+                   workers: int = 1) -> List[dict]:
+    """
+        Lints many notebooks, optionally spreading them over a pool of worker processes
+
+        Args:
+            notebook_paths(Iterable[Path]): paths of the notebooks to be linted
+            bottom_size(int): number of cells starting from the bottom of the notebook
+            filename_max_length(int): threshold length under which the notebook filename is considered "short"
+            workers(int): maximum number of worker processes; the default works serially, None uses one process
+                          per processor. Worker processes require the calling script to be guarded by
+                          `if __name__ == '__main__':` where processes are spawned (the default on macOS and Windows)
+        Returns:
+            results: list holding the linting results of each notebook, in the same order as notebook_paths
+
+        A way you might use me is
+
+        results = lint_notebooks(Path("notebooks").glob("*.ipynb"), workers=None)
+    """
+    lint = functools.partial(_lint_notebook, bottom_size=bottom_size, filename_max_length=filename_max_length)
+    return _map_notebooks(lint, list(notebook_paths), workers)
@@ -1,12 +1,50 @@
 import os
 import tempfile
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List
 
 import git
 from pynblint import repo_linting
-from pynblint.notebook import Notebook
+from pynblint.notebook import Notebook, load_notebooks
+
+# Extraction is I/O-bound (zlib and file writes release the GIL), so a few threads overlap it well
+_EXTRACT_WORKERS = 8
+
+# Directories whose content is never searched for notebooks (the presence of .git is recorded, though)
+_DIRS_IGNORE = ('.ipynb_checkpoints', '.git')
+
+
+def _extract_notebooks(zip_file: zipfile.ZipFile, destination: str) -> bool:
+    """
+        Extracts in parallel the notebooks contained in a zip archive, skipping every other member
+
+        Args:
+            zip_file(ZipFile): the opened archive
+            destination(str): path of the directory the notebooks are extracted into
+        Returns:
+            True: in case the archive contains a .git directory
+            False: otherwise
+
+        The function is used in:
+        - LocalRepository.__init__()
+    """
+    has_git_dir = False
+    names = []
+    for name in zip_file.namelist():
+        # Same sanitization as ZipFile.extract(), so that the parent folders are created where it will write
+        parts = [part for part in name.split('/') if part not in ('', '.', '..')]
+        if '.git' in parts[:-1] or (parts and parts[-1] == '.git' and name.endswith('/')):
+            has_git_dir = True
+        if name.endswith('.ipynb') and parts and not any(part in _DIRS_IGNORE for part in parts[:-1]):
+            # Parent folders are created up front, since concurrent ZipFile.extract() calls may race on them
+            os.makedirs(os.path.join(destination, *parts[:-1]), exist_ok=True)
+            names.append(name)
+
+    with ThreadPoolExecutor(max_workers=_EXTRACT_WORKERS) as executor:
+        list(executor.map(lambda name: zip_file.extract(name, destination), names))
+    return has_git_dir
 
 
 class Repository:
@@ -22,21 +60,43 @@ class Repository:
         self.versioned = False
         # Extracted content
         self.notebooks: List[Notebook] = []  # List of Notebook objects
-
-    def retrieve_notebooks(self):
-
-        # Directories to ignore while traversing the tree
-        dirs_ignore = [
-            '.ipynb_checkpoints'
-        ]
-
-        for root, dirs, files in os.walk(self.path):
-            # `dirs[:] = value` modifies dirs in-place
-            dirs[:] = [d for d in dirs if d not in dirs_ignore]
-            for f in files:
-                if f.endswith(".ipynb"):
-                    nb = Notebook(Path(root) / Path(f), repository_path=self.path)
-                    self.notebooks.append(nb)
+        self.has_git_dir = False  # True if a .git directory was found while retrieving the notebooks
+
+    def retrieve_notebooks(self, workers: int = 1):
+        """
+            Collects the notebooks of the repository
+
+            Args:
+                workers(int): maximum number of worker processes loading the notebooks; the default loads them
+                              serially, None uses one process per processor. Worker processes require the calling
+                              script to be guarded by `if __name__ == '__main__':` where processes are spawned
+                              (the default on macOS and Windows)
+        """
+
+        notebook_paths = []
+        # Iterative os.scandir() traversal: the file type comes with each DirEntry, so no stat() call is needed.
+        # Subdirectories are pushed in reverse to visit the tree in the same top-down order as os.walk()
+        stack = [self.path]
+        while stack:
+            subdirs = []
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            if entry.name == '.git':
+                                self.has_git_dir = True
+                            # Symbolic links to directories are not followed
+                            if entry.name not in _DIRS_IGNORE and not entry.is_symlink():
+                                subdirs.append(entry.path)
+                        elif entry.name.endswith(".ipynb"):
+                            notebook_paths.append(Path(entry.path))
+            except OSError:
+                # Unreadable directories are skipped, as os.walk() does
+                continue
+            stack.extend(reversed(subdirs))
+
+        # Notebooks can be loaded in parallel, since reading and converting each of them is independent
+        self.notebooks.extend(load_notebooks(notebook_paths, repository_path=self.path, workers=workers))
 
     def get_notebooks_results(self, bottom_size: int = 4, filename_max_length=None):
         """This function takes the list of notebook objects from the current repository and returns a list of dictionaries containing the related
@@ -72,20 +132,10 @@ class LocalRepository(Repository):
     """
 
     def is_versioned(self):
-        # Directories to ignore while traversing the tree
-        dirs_ignore = [
-            '.ipynb_checkpoints'
-        ]
-        versioned = False
-        for root, dirs, files in os.walk(self.path):
-            # `dirs[:] = value` modifies dirs in-place
-            dirs[:] = [d for d in dirs if d not in dirs_ignore]
-            for d in dirs:
-                if d == ".git":
-                    versioned = True
-        return versioned
-
-    def __init__(self, source_path: Path, repository_name: str = None):
+        # The repository tree is traversed only once, by retrieve_notebooks(), which records any .git directory
+        return self.has_git_dir
+
+    def __init__(self, source_path: Path, repository_name: str = None, workers: int = 1):
         super().__init__()
         self.source_path = source_path
         self.repository_name = repository_name
@@ -95,11 +145,11 @@ class LocalRepository(Repository):
             # Create temp directory
             tmp_dir = tempfile.TemporaryDirectory()
 
-            # Extract the zip file into the temp folder
+            # Extract the notebooks of the zip file into the temp folder; the rest of the archive is never inspected
             with zipfile.ZipFile(self.source_path, 'r') as zip_file:
-                zip_file.extractall(tmp_dir.name)
+                self.has_git_dir = _extract_notebooks(zip_file, tmp_dir.name)
             self.path = Path(tmp_dir.name)
-            self.retrieve_notebooks()
+            self.retrieve_notebooks(workers)
             self.versioned = self.is_versioned()
 
             # Clean up the temp directory
@@ -108,7 +158,7 @@ class LocalRepository(Repository):
         # Handle local folders
         elif self.source_path.is_dir():
             self.path = self.source_path
-            self.retrieve_notebooks()
+            self.retrieve_notebooks(workers)
             self.versioned = self.is_versioned()
 
         else:
@@ -120,19 +170,33 @@ class GitHubRepository(Repository):
     This class stores data about a GitHub repository
     """
 
-    def __init__(self, github_url: str):
+    def __init__(self, github_url: str, workers: int = 1):
         super().__init__()
         self.url = github_url
         self.versioned = True
         # Create temp directory
         tmp_dir = tempfile.TemporaryDirectory()
 
-        # Clone the repo into the temp directory
-        git.Git(tmp_dir.name).clone(github_url, depth=1)
+        # Clone the repo into the temp directory. Only the notebooks are inspected, so the clone fetches no blob
+        # (--filter=blob:none, --no-checkout) and the sparse checkout below downloads just the .ipynb files
         self.path = Path(tmp_dir.name) / github_url.split("/")[-1]
+        lfs_env = {'GIT_LFS_SKIP_SMUDGE': '1'}  # leave LFS-tracked files (datasets, models) as pointer files
+        repo = git.Repo.clone_from(
+            github_url,
+            to_path=self.path,
+            multi_options=['--depth=1', '--single-branch', '--no-tags', '--filter=blob:none', '--no-checkout'],
+            env=lfs_env
+        )
+        repo.git.config('core.sparseCheckout', 'true')
+        os.makedirs(os.path.join(repo.git_dir, 'info'), exist_ok=True)
+        with open(os.path.join(repo.git_dir, 'info', 'sparse-checkout'), 'w') as f:
+            f.write('*.ipynb\n')
+        with repo.git.custom_environment(**lfs_env):
+            repo.git.checkout()
+        repo.close()
 
         # Analyze the repo
-        self.retrieve_notebooks()
+        self.retrieve_notebooks(workers)
 
         # Clean up the temp directory
         tmp_dir.cleanup()
@@ -12,10 +12,11 @@ setuptools.setup(
     python_requires=">=3.7.10",
     install_requires=[
         "ipython",
-        "nbformat",
-        "nbconvert",
         "GitPython"
     ],
+    extras_require={
+        "speedups": ["orjson"],
+    },
     entry_points={
         "console_scripts": [
             "pynblint=pynblint.__main__:main",
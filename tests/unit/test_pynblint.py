@@ -1,7 +1,12 @@
-from pynblint.notebook import Notebook
-from pynblint.repository import LocalRepository
-from pynblint import nb_linting, repo_linting
+from pynblint.notebook import Notebook, lint_notebooks, load_notebooks
+from pynblint.repository import GitHubRepository, LocalRepository
+from pynblint import cache, nb_linting, repo_linting
 from pathlib import Path
+from types import SimpleNamespace
+import ast
+import git
+import json
+import zipfile
 import pytest
 
 if __name__ == '__main__':
@@ -14,11 +19,13 @@ def notebooks():
     nb2 = Notebook(Path("../fixtures", "FullNotebookFullNotebookFullNotebook.ipynb"))
     nb3 = Notebook(Path("../fixtures", "acs,.-e+.ipynb"))
     nb4 = Notebook(Path("../fixtures", "Untitled.ipynb"))
+    nb5 = Notebook(Path("../fixtures", "LateImportFrom.ipynb"))
     return {
         "FullNotebook2.ipynb": nb1,
         "FullNotebookFullNotebookFullNotebook.ipynb": nb2,
         "acs,.-e+.ipynb": nb3,
-        "Untitled.ipynb": nb4
+        "Untitled.ipynb": nb4,
+        "LateImportFrom.ipynb": nb5
     }
 
 
@@ -88,14 +95,26 @@ def test_count_func_defs(test_input, expected, notebooks):
     assert nb_linting.count_func_defs(notebooks[test_input]) == expected
 
 
+def test_ast_stats():
+    stats = nb_linting.ast_stats(ast.parse("def f():\n    pass\n\n\nasync def g():\n    pass\n\n\nclass C:\n"
+                                           "    def method(self):\n        pass\n"))
+    assert (stats.func_defs, stats.class_defs) == (2, 1)
+
+
 @pytest.mark.parametrize("test_input,expected", [
     ("FullNotebook2.ipynb", False),
-    ("FullNotebookFullNotebookFullNotebook.ipynb", True)
+    ("FullNotebookFullNotebookFullNotebook.ipynb", True),
+    ("LateImportFrom.ipynb", False)
 ])
 def test_are_imports_in_first_cell(test_input, expected, notebooks):
     assert nb_linting.are_imports_in_first_cell(notebooks[test_input]) == expected
 
 
+def test_are_imports_in_first_cell_syntax_error():
+    cells = [{"cell_type": "code", "source": source} for source in ["import os", "import (", "print(os.sep)"]]
+    assert nb_linting.are_imports_in_first_cell(SimpleNamespace(nb_dict={"cells": cells}))
+
+
 @pytest.mark.parametrize("test_input,expected", [
     ("FullNotebook2.ipynb", 0),
     ("FullNotebookFullNotebookFullNotebook.ipynb", 8)
@@ -152,6 +171,45 @@ def test_count_bottom_empty_cells(test_input, expected, notebooks):
     assert nb_linting.count_bottom_empty_cells(notebooks[test_input]) == expected
 
 
+@pytest.mark.parametrize("test_input,expected", [
+    ("FullNotebook2.ipynb", nb_linting.NotebookStats(cells=3, code_cells=3, linear_execution_order=False)),
+    ("FullNotebookFullNotebookFullNotebook.ipynb", nb_linting.NotebookStats(cells=15, md_cells=5, code_cells=9,
+                                                                            raw_cells=1, md_lines=8, md_titles=1,
+                                                                            bottom_md_lines=3)),
+    ("Untitled.ipynb", nb_linting.NotebookStats(cells=13, code_cells=13, non_executed_cells=2, empty_cells=1,
+                                                bottom_non_executed_cells=1, bottom_empty_cells=1,
+                                                linear_execution_order=False))
+])
+def test_compute_stats(test_input, expected, notebooks):
+    assert nb_linting.compute_stats(notebooks[test_input].nb_dict) == expected
+
+
+def test_compute_stats_bottom_with_md_cells():
+    # The bottom is made of the last bottom_size cells of any type, not of the last bottom_size code cells:
+    # only cells 2 to 5 are counted, although the last four code cells are cells 0, 1, 2 and 4
+    nb_dict = {"cells": [
+        {"cell_type": "code", "execution_count": None, "source": "x = 1"},
+        {"cell_type": "code", "execution_count": None, "source": ""},
+        {"cell_type": "code", "execution_count": None, "source": "y = 2"},
+        {"cell_type": "markdown", "source": "# Results"},
+        {"cell_type": "code", "execution_count": None, "source": ""},
+        {"cell_type": "markdown", "source": "text"}
+    ]}
+    stats = nb_linting.compute_stats(nb_dict, bottom_size=4)
+    assert (stats.non_executed_cells, stats.empty_cells) == (2, 2)
+    assert (stats.bottom_non_executed_cells, stats.bottom_empty_cells, stats.bottom_md_lines) == (1, 1, 2)
+
+
+@pytest.mark.parametrize("source", [
+    "# Title\n  ## Subtitle\ntext",
+    ["# Title\n", "  ## Subtitle\n", "text"]
+])
+def test_compute_stats_md_source(source):
+    nb_dict = {"cells": [{"cell_type": "markdown", "source": source}]}
+    stats = nb_linting.compute_stats(nb_dict)
+    assert (stats.md_lines, stats.md_titles) == (3, 2)
+
+
 @pytest.mark.parametrize("test_input,expected", [
     ("FullNotebook2.ipynb", True),
     ("Untitled.ipynb", False)
@@ -160,6 +218,15 @@ def test_is_titled(test_input, expected, notebooks):
     assert nb_linting.is_titled(notebooks[test_input]) == expected
 
 
+@pytest.mark.parametrize("filename,expected", [
+    ("Untitled1.ipynb", False),
+    ("Untitled12.ipynb", False),
+    ("UntitledAnalysis.ipynb", True)
+])
+def test_is_titled_numbered_default(filename, expected):
+    assert nb_linting.is_titled(SimpleNamespace(path=Path(filename))) == expected
+
+
 @pytest.mark.parametrize("test_input,expected", [
     ("acs,.-e+.ipynb", False),
     ("Untitled.ipynb", True)
@@ -200,3 +267,142 @@ def test_get_untitled_notebooks(test_input, expected, repos):
 ])
 def test_is_versioned(test_input, expected, repos):
     assert repos[test_input].versioned == expected
+
+
+@pytest.mark.parametrize("members,expected_versioned", [
+    (["repo/.git/HEAD", "repo/Test.ipynb", "repo/prova/Test.ipynb", "repo/data.csv"], True),
+    (["repo/Test.ipynb", "repo/prova/Test.ipynb", "repo/.ipynb_checkpoints/Test.ipynb"], False)
+])
+def test_local_zip_repository(members, expected_versioned, tmp_path):
+    notebook = Path("../fixtures", "FullNotebook2.ipynb").read_bytes()
+    archive = tmp_path / "repo.zip"
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        for member in members:
+            zip_file.writestr(member, notebook if member.endswith(".ipynb") else b"")
+    repo = LocalRepository(archive)
+    assert sorted(nb.path.relative_to(repo.path) for nb in repo.notebooks) == \
+        [Path("repo", "Test.ipynb"), Path("repo", "prova", "Test.ipynb")]
+    assert repo.versioned == expected_versioned
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_lint_notebooks(workers, notebooks):
+    paths = [notebook.path for notebook in notebooks.values()]
+    expected = [notebook.get_pynblint_results() for notebook in notebooks.values()]
+    assert lint_notebooks(paths, workers=workers) == expected
+
+
+def test_load_notebooks_parallel(notebooks):
+    # Enough notebooks for the worker processes to be used, whose Notebook objects are sent back to the parent
+    paths = [notebook.path for notebook in notebooks.values()]
+    loaded = load_notebooks(paths, workers=2)
+    assert [notebook.path for notebook in loaded] == paths
+    assert [(notebook.nb_dict, notebook.script) for notebook in loaded] == \
+        [(notebook.nb_dict, notebook.script) for notebook in notebooks.values()]
+
+
+def test_cache_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    assert cache.load("0123") is None
+    cache.store("0123", ({"cells": []}, "x = 1"))
+    assert cache.load("0123") == ({"cells": []}, "x = 1")
+    assert str(cache.CACHE_FORMAT_VERSION) in cache._entry_path("0123")
+    assert Path(cache._entry_path("0123")).read_bytes()[:2] == b"\x80\x04"  # readable by every supported Python
+
+
+
+@pytest.mark.parametrize("entry", [
+    b"\x80\x09N.",  # unsupported pickle protocol
+    b"cpynblint_missing_module\nValue\n.",  # class that cannot be imported
+    b"\x80\x04\x95",  # truncated entry
+])
+def test_cache_unreadable_entry(entry, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    path = Path(cache._entry_path("0123"))
+    path.parent.mkdir(parents=True)
+    path.write_bytes(entry)
+    assert cache.load("0123") is None
+
+def test_cache_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", None)
+    cache.store("0123", "value")
+    assert cache.load("0123") is None
+    assert not cache.enabled()
+
+
+def test_cache_failed_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    cache.store("0123", lambda: None)  # lambdas cannot be pickled
+    assert cache.load("0123") is None
+    assert list(Path(cache._entry_path("0123")).parent.iterdir()) == []  # no temporary file is left behind
+
+
+def test_notebook_cache_hit(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    path = Path("../fixtures", "LateImportFrom.ipynb")
+    first = Notebook(path)
+    # The second load must come from the cache entry written by the first one
+    monkeypatch.setattr(nb_linting, "get_cell_code", None)
+    second = Notebook(path)
+    assert (second.nb_dict, second.script) == (first.nb_dict, first.script)
+
+
+def test_script_stats_visited_once(tmp_path, monkeypatch):
+    cell = {"cell_type": "code", "execution_count": 1, "metadata": {}, "outputs": [],
+            "source": ["def f():\n", "    pass\n", "\n", "\n", "class C:\n", "    pass\n"]}
+    path = tmp_path / "Definitions.ipynb"
+    path.write_text(json.dumps({"cells": [cell], "metadata": {}, "nbformat": 4, "nbformat_minor": 5}))
+    notebook = Notebook(path)
+    assert nb_linting.count_func_defs(notebook) == 1
+    # The class count must be served by the statistics collected above, without visiting the AST again
+    monkeypatch.setattr(nb_linting, "ast_stats", None)
+    assert nb_linting.count_class_defs(notebook) == 1
+
+
+def test_github_repository_sparse_clone(tmp_path):
+    # A local repository stands in for GitHub: only its notebooks must be checked out
+    source = tmp_path / "source"
+    (source / "prova").mkdir(parents=True)
+    notebook = Path("../fixtures", "FullNotebook2.ipynb").read_bytes()
+    (source / "Test.ipynb").write_bytes(notebook)
+    (source / "prova" / "Test.ipynb").write_bytes(notebook)
+    (source / "data.csv").write_text("a,b\n")
+    origin = git.Repo.init(source)
+    origin.index.add(["Test.ipynb", str(Path("prova", "Test.ipynb")), "data.csv"])
+    origin.index.commit("Add notebooks", author=git.Actor("pynblint", "pynblint@example.com"),
+                        committer=git.Actor("pynblint", "pynblint@example.com"))
+    repo = GitHubRepository(source.as_uri())
+    assert [nb.path.relative_to(repo.path) for nb in repo.notebooks] == \
+        [Path("Test.ipynb"), Path("prova", "Test.ipynb")]
+    assert repo.versioned
+
+
+@pytest.mark.parametrize("prefix,value", [
+    (b"", b"NaN"),
+    (b"", b"-Infinity"),
+    (b"\xef\xbb\xbf", b"1")  # UTF-8 BOM
+])
+def test_notebook_lenient_json(prefix, value, tmp_path):
+    # Notebooks must load the same way whether or not the optional orjson decoder is installed
+    output = b'{"output_type": "execute_result", "execution_count": 1, "metadata": {}, ' \
+             b'"data": {"application/json": {"v": ' + value + b'}}}'
+    cell = b'{"cell_type": "code", "execution_count": 1, "metadata": {}, "outputs": [' + output + b'], ' \
+           b'"source": ["def f():\\n", "    pass"]}'
+    path = tmp_path / "Lenient.ipynb"
+    path.write_bytes(prefix + b'{"cells": [' + cell + b'], "metadata": {}, "nbformat": 4, "nbformat_minor": 5}')
+    notebook = Notebook(path)
+    assert notebook.nb_dict["cells"][0]["source"] == "def f():\n    pass"
+    assert nb_linting.count_func_defs(notebook) == 1
+
+
+def test_script_excludes_raw_cells(tmp_path):
+    cells = [
+        {"cell_type": "raw", "metadata": {}, "source": "def f():\n    pass\n\n\nclass C:\n    pass"},
+        {"cell_type": "code", "execution_count": 1, "metadata": {}, "outputs": [], "source": "def g():\n    pass"}
+    ]
+    path = tmp_path / "RawCells.ipynb"
+    path.write_text(json.dumps({"cells": cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5}))
+    notebook = Notebook(path)
+    # Only the code cell is part of the script, so the definitions in the raw cell are not counted
+    assert notebook.script == "def g():\n    pass\n"
+    assert (nb_linting.count_func_defs(notebook), nb_linting.count_class_defs(notebook)) == (1, 0)